@@ -48,14 +48,64 @@ You'll probably need this when calculating a transaction id.
 import sys
 assert sys.version_info >= (3, 6)
 import hashlib
+import os
 import pdb
-import copy
 import json
+import concurrent.futures
+import weakref
 # pip3 install dill
 import dill as serializer
 
+# pip3 install pyrsistent (optional): persistent maps let each block's UTXO
+# set structurally share unchanged entries with its parent's, so per-block
+# storage is proportional to what the block changed rather than to the whole
+# set.  Without it, UTXO sets fall back to plain (shallow-copied) dicts.
+try:
+    from pyrsistent import pmap as _pmap
+    _PMAP_TYPE = type(_pmap())
+except ImportError:
+    _pmap = None
+    _PMAP_TYPE = None
+
+# 32 zero bytes: pads odd merkle levels and stands in for a None constraint.
+ZERO_HASH = bytes(32)
+
+# hashlib.sha256 already dispatches to OpenSSL's C (and where available,
+# SHA-NI) implementation, so the hot reducers just bind it once here rather
+# than re-resolving the attribute; a JIT'd pure-Python SHA-256 would be
+# slower, not faster.
+_sha256 = hashlib.sha256
+
+# Serialized-constraint digests.  Closure-free lambdas are keyed by their
+# __code__ object, so re-creating the same standard constraint per
+# transaction (a common pattern) still hits the cache; anything carrying
+# state in a closure or defaults is keyed by the function object itself.
+_CONSTRAINT_DIGESTS = weakref.WeakKeyDictionary()
+
+def _constraintDigest(constraint):
+    """ Return a 32-byte digest identifying a constraint script.
+        Dilling a lambda is by far the most expensive part of encoding a
+        transaction, so the digest is cached per unique script. """
+    if constraint is None:
+        return ZERO_HASH
+    if (constraint.__closure__ is None and not constraint.__defaults__
+            and not constraint.__kwdefaults__):
+        # Behavior is fully determined by the bytecode, so equivalent
+        # lambdas built at different times can share one serialization.
+        key = constraint.__code__
+    else:
+        key = constraint
+    cached = _CONSTRAINT_DIGESTS.get(key)
+    if cached is None:
+        cached = hashlib.sha256(serializer.dumps(constraint)).digest()
+        _CONSTRAINT_DIGESTS[key] = cached
+    return cached
+
+
 class Output:
     """ This models a transaction output """
+    __slots__ = ('constraint', 'amount')
+
     def __init__(self, constraint = None, amount = 0):
         """ constraint is a function that takes 1 argument which is a list of 
             objects and returns True if the output can be spent.  For example:
@@ -85,6 +135,8 @@ class Output:
 
 class Input:
     """ This models an input (what is being spent) to a blockchain transaction """
+    __slots__ = ('txHash', 'txIdx', 'satisfier')
+
     def __init__(self, txHash, txIdx, satisfier):
         """ This input references a prior output by txHash and txIdx.
             txHash is therefore the prior transaction hash
@@ -97,6 +149,8 @@ class Input:
 
 class Transaction:
     """ This is a blockchain transaction """
+    __slots__ = ('inputs', 'outputs', 'data', '_hash', '_hashBytes')
+
     def __init__(self, inputs=None, outputs=None, data = None):
         """ Initialize a transaction from the provided parameters.
             inputs is a list of Input objects that refer to unspent outputs.
@@ -107,19 +161,52 @@ class Transaction:
         self.inputs = inputs
         self.outputs = outputs
         self.data = data
+        # Memoized txid -- transactions are not mutated after creation, so
+        # the first getHash() result is good for the object's lifetime.
+        self._hash = None
+        self._hashBytes = None
+
+    def _encode(self):
+        """ Canonically encode this transaction as bytes for hashing.
+            Fields are fixed-width or length-prefixed so the encoding is
+            unambiguous; constraint scripts are represented by their cached
+            digest so dill only ever runs once per unique script. """
+        # Flag byte distinguishes a mint (inputs is None) from an empty list.
+        parts = [b'\x01' if self.inputs is None else b'\x00']
+        inputs = self.inputs if self.inputs else []
+        parts.append(len(inputs).to_bytes(4, 'big'))
+        for inp in inputs:
+            satisfier = serializer.dumps(inp.satisfier)
+            parts.append(inp.txHash.to_bytes(32, 'big'))
+            parts.append(inp.txIdx.to_bytes(4, 'big'))
+            parts.append(len(satisfier).to_bytes(4, 'big'))
+            parts.append(satisfier)
+        outputs = self.outputs if self.outputs else []
+        parts.append(len(outputs).to_bytes(4, 'big'))
+        for out in outputs:
+            amount = repr(out.amount).encode()
+            parts.append(len(amount).to_bytes(4, 'big'))
+            parts.append(amount)
+            parts.append(_constraintDigest(out.constraint))
+        data = self.data if self.data is not None else b''
+        if not isinstance(data, (bytes, bytearray)):
+            data = serializer.dumps(data)
+        parts.append(len(data).to_bytes(4, 'big'))
+        parts.append(bytes(data))
+        return b''.join(parts)
+
+    def getHashBytes(self):
+        """ Return this transaction's sha256 digest as 32 bytes.  Internal
+            consumers (the merkle tree) use this to avoid int round-trips. """
+        if self._hashBytes is None:
+            self._hashBytes = hashlib.sha256(self._encode()).digest()
+        return self._hashBytes
 
     def getHash(self):
         """Return this transaction's probabilistically unique identifier as a big-endian integer"""
-         # Serialize the transaction data (inputs, outputs, and any additional data)
-        serialized_data = serializer.dumps((self.inputs, self.outputs, self.data))
-        
-        # Compute the SHA-256 hash of the serialized data
-        hash_bytes = hashlib.sha256(serialized_data).digest()
-
-        # Convert the hash (byte array) to a big-endian integer
-        transaction_id = int.from_bytes(hash_bytes, 'big')
-
-        return transaction_id
+        if self._hash is None:
+            self._hash = int.from_bytes(self.getHashBytes(), 'big')
+        return self._hash
 
     def getInputs(self):
         """ return a list of all inputs that are being spent """
@@ -173,6 +260,89 @@ class Transaction:
         return input_sum >= output_sum
 
 
+def _hashPairs(level):
+    """ Hash every adjacent 32-byte pair in a buffer of concatenated node
+        hashes and return the concatenated parent hashes (half the size).
+        An odd trailing node is paired with 32 zero bytes.
+
+        Operating on a whole level at a time keeps the data contiguous and
+        gives a single call boundary where a multi-buffer SHA-256
+        implementation could be dropped in; here each pair goes through
+        hashlib one at a time.
+
+        The odd case is handled once by padding the buffer up front, so the
+        inner loop is a branchless walk over uniform 64-byte slices.
+
+        Every input here is exactly 64 bytes, so a backend with the padding
+        block's message schedule precomputed could halve the compression
+        work per node; hashlib exposes no fixed-length entry point, so that
+        (like multi-buffer batching) is deferred to a native backend.
+    """
+    sha256 = _sha256
+    if len(level) % 64:
+        level = level + ZERO_HASH
+    return b''.join(sha256(level[i:i + 64]).digest()
+                    for i in range(0, len(level), 64))
+
+
+def _streamRoot(leafHashes):
+    """ Compute the merkle root from an iterable of 32-byte leaf hashes
+        while holding only the "leading edge" of the tree: a stack of at
+        most log2(n)+1 partial subtree hashes, tagged with their height.
+
+        Each leaf is pushed and equal-height subtrees are collapsed
+        greedily; at the end the trailing partial subtrees are lifted with
+        32 zero bytes per level, which reproduces exactly the pad-odd-
+        levels-with-0 rule of the level-by-level reduction.  Returns the
+        32-byte root.
+    """
+    sha256 = _sha256
+    stack = []  # (height, hash) pairs, heights strictly decreasing below the top
+    for node in leafHashes:
+        height = 0
+        while stack and stack[-1][0] == height:
+            _, left = stack.pop()
+            node = sha256(left + node).digest()
+            height += 1
+        stack.append((height, node))
+    height, node = stack.pop()
+    while stack:
+        leftHeight, left = stack.pop()
+        while height < leftHeight:
+            node = sha256(node + ZERO_HASH).digest()
+            height += 1
+        node = sha256(left + node).digest()
+        height += 1
+    return node
+
+
+# Leaf count at which calcMerkleRoot starts farming subtrees out to threads.
+_PARALLEL_MIN_LEAVES = 64
+_MERKLE_POOL = None
+
+def _getMerklePool():
+    """ Return the shared worker pool for subtree hashing, creating it on
+        first use so importing this module doesn't spin up threads. """
+    global _MERKLE_POOL
+    if _MERKLE_POOL is None:
+        workers = min(8, os.cpu_count() or 1)
+        # Round down to a power of two so the leaf vector splits into
+        # complete subtrees.
+        workers = 1 << (workers.bit_length() - 1)
+        _MERKLE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    return _MERKLE_POOL
+
+
+def _leafHashBytes(obj):
+    """ Return an object's hash as 32 big-endian bytes, preferring a native
+        getHashBytes() and falling back to converting the getHash() int for
+        objects that only implement the integer API. """
+    getHashBytes = getattr(obj, 'getHashBytes', None)
+    if getHashBytes is not None:
+        return getHashBytes()
+    return obj.getHash().to_bytes(32, 'big')
+
+
 class HashableMerkleTree:
     """ A merkle tree of hashable objects.
 
@@ -191,22 +361,107 @@ class HashableMerkleTree:
 
     def __init__(self, hashableList = None):
         self.objects = hashableList if hashableList else []
-        self.hashableList = [i.getHash() for i in self.objects] if hashableList else []
+        # Leaf hashing is deferred until a root is actually needed, so
+        # setting block contents doesn't trigger N getHash calls up front;
+        # both the leaves and the root are cached once computed.
+        self._leafHashes = None
+        self._cachedRoot = None
+
+    def _getLeafHashes(self):
+        """ Return the leaf hashes as a list of 32-byte values, computing
+            them on first use.  Bytes throughout the reduction pipeline;
+            ints only appear at the API boundary. """
+        if self._leafHashes is None:
+            self._leafHashes = [_leafHashBytes(o) for o in self.objects]
+        return self._leafHashes
 
     def calcMerkleRoot(self):
         """ Calculate the merkle root of this tree."""
-        if not self.hashableList:
+        if self._cachedRoot is None:
+            self._cachedRoot = self._computeRoot()
+        return self._cachedRoot
+
+    def _computeRoot(self):
+        leaves = self._getLeafHashes()
+        if not leaves:
             return 0
-        current_level = self.hashableList
-        while len(current_level) > 1:
-            next_level = []
-            for i in range(0, len(current_level), 2):
-                left = current_level[i]
-                right = current_level[i + 1] if i + 1 < len(current_level) else 0
-                combined = left.to_bytes(32, 'big') + right.to_bytes(32, 'big')
-                next_level.append(int.from_bytes(hashlib.sha256(combined).digest(), 'big'))
-            current_level = next_level
-        return current_level[0]
+        n = len(leaves)
+        # Large power-of-two leaf vectors split into complete subtrees, so
+        # their roots can be computed on worker threads and combined with a
+        # normal pairwise reduction.  Unaligned chunking would interact with
+        # the pad-odd-levels-with-0 rule and change the root, so any other
+        # leaf count takes the serial path.
+        if n >= _PARALLEL_MIN_LEAVES and n & (n - 1) == 0:
+            pool = _getMerklePool()
+            workers = pool._max_workers
+            if workers > 1:
+                chunk = n // workers
+                roots = pool.map(_streamRoot,
+                                 (leaves[i:i + chunk] for i in range(0, n, chunk)))
+                level = b''.join(roots)
+                while len(level) > 32:
+                    level = _hashPairs(level)
+                return int.from_bytes(level, 'big')
+        # Stream the leaves through the log-space edge reducer; only the
+        # final 32-byte root is converted back to an int for the API.
+        return int.from_bytes(_streamRoot(leaves), 'big')
+
+
+class UtxoOverlay:
+    """ A copy-on-write view over a parent UTXO mapping.
+
+        Reads fall through to the parent; writes and deletions are recorded
+        in small per-overlay structures, so validating a block costs work
+        proportional to the transactions it contains rather than the size
+        of the whole UTXO set.  Outputs are never mutated in place, so
+        sharing them with the parent is safe.
+    """
+    def __init__(self, parent):
+        self.parent = parent
+        self.added = {}
+        self.removed = set()
+
+    def __contains__(self, key):
+        if key in self.added:
+            return True
+        return key not in self.removed and key in self.parent
+
+    def __getitem__(self, key):
+        if key in self.added:
+            return self.added[key]
+        if key in self.removed:
+            raise KeyError(key)
+        return self.parent[key]
+
+    def __setitem__(self, key, value):
+        self.removed.discard(key)
+        self.added[key] = value
+
+    def __delitem__(self, key):
+        if key in self.added:
+            del self.added[key]
+            # The key may shadow a parent entry (e.g. a child block whose
+            # coinbase reproduces a parent txid); tombstone it too so the
+            # delete removes the key from the merged view like dict's did.
+            if key in self.parent:
+                self.removed.add(key)
+        elif key in self.parent and key not in self.removed:
+            self.removed.add(key)
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def materialize(self):
+        """ Flatten this overlay into a plain dict (shallow: output objects
+            are shared, never copied). """
+        flat = {k: v for k, v in self.parent.items() if k not in self.removed}
+        flat.update(self.added)
+        return flat
 
 
 class BlockContents:
@@ -231,6 +486,10 @@ class Block:
         It should have the normal fields needed in a block and also an instance of "BlockContents"
         where we will store a merkle tree of transactions.
     """
+    __slots__ = ('prior_block_hash', 'version', 'merkle_tree', 'target', 'nonce',
+                 'block_contents', 'timestamp', '_header_prefix',
+                 '_header_prefix_key', '_hash', '_hashBytes', '_hash_key')
+
     def __init__(self):
         # Hint, beyond the normal block header fields what extra data can you keep track of per block to make implementing other APIs easier?
         self.prior_block_hash = None
@@ -239,7 +498,21 @@ class Block:
         self.target = None
         self.nonce = 0
         self.block_contents = BlockContents()
-        self.timestamp = None 
+        self.timestamp = None
+        # Packed bytes of the header fields that precede the nonce, rebuilt
+        # lazily whenever one of those fields changes.  The field values the
+        # prefix was built from are kept alongside it so changes through any
+        # path — setters, BlockContents.setData, or direct assignment to
+        # public fields like timestamp — are noticed; the merkle root in the
+        # key is cheap because the tree caches it.
+        self._header_prefix = None
+        self._header_prefix_key = None
+        # Memoized block hash (as digest bytes and as an int) plus the
+        # header fields it was computed from, so getHash() only re-hashes
+        # when the header actually changes.
+        self._hash = None
+        self._hashBytes = None
+        self._hash_key = None
 
     def getContents(self):
         """ Return the Block content (a BlockContents object)"""
@@ -259,12 +532,39 @@ class Block:
         """ Return the difficulty target of this block """
         return self.target
 
+    def _getHeaderPrefix(self):
+        """ Return the packed header bytes that precede the nonce:
+            prior hash (32) || merkle root (32) || timestamp (8) || target (32).
+            The nonce goes last so mining can reuse a single partially-updated
+            sha256 state for the whole prefix.  Unset fields pack as 0 so the
+            header width is always fixed. """
+        merkle_root = self.block_contents.calcMerkleRoot()
+        key = (self.prior_block_hash, merkle_root, self.timestamp, self.target)
+        if self._header_prefix_key != key:
+            # Targets of 2**256 or more don't fit the field; they are all
+            # equally (trivially) satisfiable, so clamp them to the max.
+            target = min(self.target or 0, (1 << 256) - 1)
+            self._header_prefix = ((self.prior_block_hash or 0).to_bytes(32, 'big') +
+                                   merkle_root.to_bytes(32, 'big') +
+                                   (self.timestamp or 0).to_bytes(8, 'big') +
+                                   target.to_bytes(32, 'big'))
+            self._header_prefix_key = key
+        return self._header_prefix
+
+    def _getHashBytes(self):
+        """ Return this block's hash as a 32-byte big-endian digest, sharing
+            the memo with getHash(). """
+        key = (self._getHeaderPrefix(), self.nonce)
+        if self._hash_key != key:
+            self._hashBytes = _sha256(key[0] + self.nonce.to_bytes(8, 'big')).digest()
+            self._hash = int.from_bytes(self._hashBytes, 'big')
+            self._hash_key = key
+        return self._hashBytes
+
     def getHash(self):
         """ Calculate the hash of this block. Return as an integer """
-        header_data = (str(self.prior_block_hash) + str(self.block_contents.calcMerkleRoot()) + 
-                      str(self.timestamp) + str(self.nonce) + str(self.target)).encode()
-        return int.from_bytes(hashlib.sha256(header_data).digest(), 'big')
-        
+        self._getHashBytes()
+        return self._hash
 
     def setPriorBlockHash(self, priorHash):
         """ Assign the parent block hash """
@@ -277,9 +577,27 @@ class Block:
     def mine(self,tgt):
         """Update the block header to the passed target (tgt) and then search for a nonce which produces a block who's hash is less than the passed target, "solving" the block"""
         self.setTarget(tgt)
-        self.nonce = 0
-        while self.getHash() >= tgt:
-            self.nonce += 1
+        # Everything in the header except the trailing nonce is invariant
+        # across the search, so hash the 104-byte prefix into a sha256 state
+        # once and per attempt just copy that state and feed the 8 nonce
+        # bytes: the prefix's compression blocks run once for all nonces.
+        base = _sha256(self._getHeaderPrefix())
+        if tgt >= 1 << 256:
+            # Every 256-bit hash beats an over-wide target.
+            self.nonce = 0
+            return
+        # Digests are big-endian, so comparing raw bytes against the packed
+        # target is equivalent to the int comparison without materializing a
+        # big-int per attempt.
+        tgt_bytes = tgt.to_bytes(32, 'big')
+        nonce = 0
+        while True:
+            h = base.copy()
+            h.update(nonce.to_bytes(8, 'big'))
+            if h.digest() < tgt_bytes:
+                break
+            nonce += 1
+        self.nonce = nonce
         
 
     def validate(self, unspentOutputs, maxMint): ##check this once 
@@ -296,10 +614,10 @@ class Block:
 
             461: you can ignore the unspentOutputs field (just pass {} when calling this function)
         """
-        if self.getHash() >= self.target:
+        if self.target < 1 << 256 and self._getHashBytes() >= self.target.to_bytes(32, 'big'):
             return None
 
-        current_utxos = copy.deepcopy(unspentOutputs)
+        current_utxos = UtxoOverlay(unspentOutputs)
         transactions = self.block_contents.getData().objects if (self.block_contents and 
                       self.block_contents.getData() and hasattr(self.block_contents.getData(), 'objects')) else []
 
@@ -355,18 +673,19 @@ class Blockchain(object):
         genesis_hash = genesis.getHash()
         self.blocks[genesis_hash] = genesis
         self.block_heights[0] = [genesis_hash]
+        # Reverse index of block_heights so extend() can find a parent's
+        # height without scanning every level.
+        self._height_of = {genesis_hash: 0}
         self.cumulative_work[genesis_hash] = self.getWork(genesisTarget)
-        self.utxo_sets[genesis_hash] = genesis.validate({}, self.maxMintCoinsPerTx)
+        self.utxo_sets[genesis_hash] = self._storeUtxoSet(genesis.validate({}, self.maxMintCoinsPerTx))
+        # Running most-work tip, updated incrementally in extend() so getTip
+        # never has to scan the whole chain.
+        self._tip_hash = genesis_hash
+        self._tip_work = self.cumulative_work[genesis_hash]
 
     def getTip(self):
         """Return the block at the tip of the chain with the most cumulative work."""
-        max_work = -1
-        tip = None
-        for block_hash, work in self.cumulative_work.items():
-            if work > max_work:
-                max_work = work
-                tip = self.blocks[block_hash]
-        return tip
+        return self.blocks[self._tip_hash]
 
     def extend(self, block):
         """Add a block to the blockchain if valid."""
@@ -387,29 +706,54 @@ class Blockchain(object):
 
         block_hash = block.getHash()
         self.blocks[block_hash] = block
-        self.utxo_sets[block_hash] = new_utxos
-        
-        parent_height = next(h for h, blocks in self.block_heights.items() 
-                           if prior_hash in blocks)
-        height = parent_height + 1
+        self.utxo_sets[block_hash] = self._storeUtxoSet(new_utxos)
         
+        height = self._height_of[prior_hash] + 1
+        self._height_of[block_hash] = height
+
         if height not in self.block_heights:
             self.block_heights[height] = []
         self.block_heights[height].append(block_hash)
         
         self.cumulative_work[block_hash] = (
-            self.cumulative_work[prior_hash] + 
+            self.cumulative_work[prior_hash] +
             self.getWork(block.getTarget())
         )
-        
+
+        if self.cumulative_work[block_hash] > self._tip_work:
+            self._tip_work = self.cumulative_work[block_hash]
+            self._tip_hash = block_hash
+
         return True
 
     
+    def _storeUtxoSet(self, overlay):
+        """ Collapse a validated UtxoOverlay into the stored per-block form.
+            With pyrsistent, that's a persistent map built from the parent's
+            with an evolver — O(changed entries) time and extra memory, with
+            everything else structurally shared.  Otherwise it's a flat
+            (shallow) dict. """
+        if _pmap is None:
+            return overlay.materialize()
+        parent = overlay.parent
+        if not isinstance(parent, _PMAP_TYPE):
+            return _pmap(overlay.materialize())
+        evolver = parent.evolver()
+        for key in overlay.removed:
+            evolver.remove(key)
+        for key, value in overlay.added.items():
+            evolver[key] = value
+        return evolver.persistent()
+
     def getWork(self, target):
-        """Calculate work based on target."""
+        """ Calculate work based on target, as an integer (2**256 // target,
+            the usual convention).  Integer work keeps cumulative sums exact
+            for arbitrarily deep chains, where float ratios would lose
+            precision and eventually misorder close forks. """
         if target == 0:
-            return float('inf')
-        return self.genesisTarget / target
+            # No hash can beat a zero target; dominate any finite sum.
+            return 1 << 512
+        return (1 << 256) // target
 
     def getCumulativeWork(self, blkHash):
         """Return cumulative work for a block hash."""